@@ -0,0 +1,120 @@
+# Copyright (c) Collab and contributors.
+# See LICENSE for details.
+
+# cython: language_level=3, boundscheck=False, wraparound=False
+
+"""
+Compiled versions of the character scanners used by
+:py:class:`atcmd.parser.ATParser`.
+
+These mirror the pure-Python implementations in :py:mod:`atcmd.parser`,
+which are used when this extension is not built.
+"""
+
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from cpython.unicode cimport (PyUnicode_FromKindAndData,
+    PyUnicode_4BYTE_KIND, Py_UNICODE_TOUPPER)
+
+
+cdef inline bint _is_ext_name_char(Py_UCS4 c):
+    # V.250 defines the following chars as legal extended command names
+    if u'A' <= c <= u'Z' or u'0' <= c <= u'9':
+        return True
+    return (c == u'!' or c == u'%' or c == u'-' or c == u'.' or
+            c == u'/' or c == u':' or c == u'_')
+
+
+cdef inline unicode _as_unicode(data):
+    # Accept str subclasses like the pure-Python scanners do, as an exact
+    # str so the typed code below can use it.
+    if type(data) is unicode:
+        return <unicode>data
+    return unicode.__str__(data)
+
+
+cdef unicode _clean_segments(unicode data):
+    # Upper-casing can change the length of non-ASCII text (e.g. u'\xdf'
+    # becomes u'SS'), so leave that to str.upper() one segment at a time.
+    cdef Py_ssize_t i
+    parts = data.split(u'"')
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace(u' ', u'').upper()
+
+    if len(parts) % 2 == 0:
+        # unmatched ", insert one.
+        parts.append(u'')
+
+    return u'"'.join(parts)
+
+
+cpdef unicode clean(data_):
+    """
+    Strip input of whitespace and force uppercase - except sections inside
+    quotes. Unmatched quotes are closed by appending a quote.
+    """
+    cdef unicode data = _as_unicode(data_)
+    cdef Py_ssize_t i, n = len(data), k = 0
+    cdef bint quoted = False
+    cdef Py_UCS4 c
+    cdef Py_UCS4 *buf = <Py_UCS4 *>PyMem_Malloc((n + 1) * sizeof(Py_UCS4))
+    if buf is NULL:
+        raise MemoryError()
+
+    try:
+        for i in range(n):
+            c = data[i]
+            if c == u'"':
+                quoted = not quoted
+            elif not quoted:
+                if c == u' ':
+                    continue
+                if c > 127:
+                    return _clean_segments(data)
+                c = Py_UNICODE_TOUPPER(c)
+            buf[k] = c
+            k += 1
+
+        if quoted:
+            # unmatched ", insert one.
+            buf[k] = u'"'
+            k += 1
+
+        return PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, buf, k)
+    finally:
+        PyMem_Free(buf)
+
+
+cpdef Py_ssize_t find_char(ch, data_, Py_ssize_t fromIndex):
+    """
+    Find a character ``ch``, ignoring quoted sections. Return length of
+    ``data`` if not found.
+    """
+    cdef unicode data = _as_unicode(data_)
+    cdef Py_ssize_t i, n = len(data)
+    cdef Py_UCS4 target = _as_unicode(ch)[0]
+    cdef bint quoted = False
+    cdef Py_UCS4 c
+
+    for i in range(max(fromIndex, 0), n):
+        c = data[i]
+        if c == u'"':
+            quoted = not quoted
+        elif c == target and not quoted:
+            return i
+
+    return n
+
+
+cpdef Py_ssize_t find_end_extended_name(data_, Py_ssize_t index):
+    """
+    Return the index of the first character at or after ``index`` that is
+    not legal in an extended command name.
+    """
+    cdef unicode data = _as_unicode(data_)
+    cdef Py_ssize_t i, n = len(data)
+
+    for i in range(max(index, 0), n):
+        if not _is_ext_name_char(data[i]):
+            return i
+
+    return n
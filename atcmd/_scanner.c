@@ -0,0 +1,44 @@
+/*
+ * Copyright (c) Collab and contributors.
+ * See LICENSE for details.
+ *
+ * C version of the delimiter scanner used by atcmd.parser, loaded through
+ * CFFI (see _scanner_build.py).
+ */
+
+#include <string.h>
+
+#include "_scanner.h"
+
+/*
+ * Find ch in data[from:len], ignoring quoted sections. Return len if not
+ * found.
+ */
+size_t at_find_char_skip_quotes(const char *data, size_t len, size_t from,
+                                char ch)
+{
+    const char *end = data + len;
+    const char *p = data + from;
+    const char *hit, *quote;
+
+    if (ch == '"')
+        return len;
+
+    while (p < end) {
+        hit = memchr(p, ch, end - p);
+
+        /* only a quote before the hit can hide it */
+        quote = memchr(p, '"', (hit ? hit : end) - p);
+        if (quote == NULL)
+            return hit ? (size_t)(hit - data) : len;
+
+        /* skip the quoted section, an unmatched quote runs to the end */
+        quote = memchr(quote + 1, '"', end - quote - 1);
+        if (quote == NULL)
+            return len;
+
+        p = quote + 1;
+    }
+
+    return len;
+}
@@ -0,0 +1,9 @@
+/*
+ * Copyright (c) Collab and contributors.
+ * See LICENSE for details.
+ */
+
+#include <stddef.h>
+
+size_t at_find_char_skip_quotes(const char *data, size_t len, size_t from,
+                                char ch);
@@ -0,0 +1,27 @@
+# Copyright (c) Collab and contributors.
+# See LICENSE for details.
+
+"""
+CFFI build script for the optional :py:mod:`atcmd._scanner_cffi` module.
+
+Used by ``setup.py`` when CFFI is installed. Paths are relative to the
+project root.
+"""
+
+from cffi import FFI
+
+
+ffibuilder = FFI()
+
+ffibuilder.cdef("""
+    size_t at_find_char_skip_quotes(const char *data, size_t len, size_t from,
+                                    char ch);
+""")
+
+ffibuilder.set_source('atcmd._scanner_cffi', '#include "_scanner.h"',
+    sources=['atcmd/_scanner.c'],
+    include_dirs=['atcmd'])
+
+
+if __name__ == '__main__':
+    ffibuilder.compile(verbose=True)
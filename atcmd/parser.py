@@ -2,10 +2,127 @@
 # See LICENSE for details.
 
 import logging
+import re
+
+try:
+    from sys import intern
+except ImportError:
+    # Python 2.7: intern is a builtin
+    pass
+
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2.7: no caching
+    def lru_cache(maxsize):
+        return lambda func: func
 
 
 logger = logging.getLogger(__name__)
 
+# V.250 defines these chars as legal extended command names; match the
+# first character that is not.
+_END_EXT_NAME_RE = re.compile(r'[^A-Z0-9!%\-./:_]')
+
+# Quoted sections are consumed by the first alternative so the delimiter
+# in group 1 only matches outside quotes.
+_FIND_SEMI = re.compile(r'"[^"]*"?|(;)')
+_FIND_COMMA = re.compile(r'"[^"]*"?|(,)')
+_FIND_CHAR = {';': _FIND_SEMI, ',': _FIND_COMMA}
+
+# Command line scanner states
+_S_START = 0   # looking for the next command
+_S_DONE = 1    # no more commands on this line
+
+# Character classes used by the command line scanner
+_C_OTHER = 0
+_C_ALPHA = 1
+_C_PLUS = 2
+_C_EQUALS = 3
+_C_QUERY = 4
+
+_CHAR_CLASS = dict.fromkeys('ABCDEFGHIJKLMNOPQRSTUVWXYZ', _C_ALPHA)
+_CHAR_CLASS.update({'+': _C_PLUS, '=': _C_EQUALS, '?': _C_QUERY})
+
+# First characters of arguments that may be converted to an integer.
+_INT_START = frozenset('+-0123456789')
+
+
+def _clean_py(data):
+    # Even indices are outside quotes, odd indices are quoted sections.
+    parts = data.split('"')
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace(' ', '').upper()
+
+    if len(parts) % 2 == 0:
+        # unmatched ", insert one.
+        parts.append('')
+
+    return '"'.join(parts)
+
+
+def _find_char_py(ch, data, fromIndex):
+    regex = _FIND_CHAR.get(ch)
+    if regex is None:
+        regex = re.compile(r'"[^"]*"?|({})'.format(re.escape(ch)))
+
+    for m in regex.finditer(data, fromIndex):
+        if m.group(1) is not None:
+            return m.start(1)
+
+    return len(data)
+
+
+def _find_end_extended_name_py(data, index):
+    m = _END_EXT_NAME_RE.search(data, index)
+    return m.start() if m else len(data)
+
+
+def _find_char_cffi(ch, data, fromIndex):
+    # The C scanner works on bytes, so only hand it ASCII lines where byte
+    # and character offsets are the same, and a single delimiter character.
+    if len(ch) != 1 or fromIndex < 0:
+        return _find_char_py(ch, data, fromIndex)
+
+    try:
+        raw = data.encode('ascii')
+        c = ch.encode('ascii')
+    except UnicodeError:
+        return _find_char_py(ch, data, fromIndex)
+
+    return _scanner.at_find_char_skip_quotes(raw, len(raw), fromIndex, c)
+
+
+_clean = _clean_py
+_find_char = _find_char_py
+_find_end_extended_name = _find_end_extended_name_py
+
+try:
+    from atcmd._scanner_cffi import lib as _scanner
+except ImportError:
+    _scanner = None
+
+try:
+    # Use the compiled scanners when the optional extension is built.
+    from atcmd._parser_c import (clean as _clean,
+        find_char as _find_char,
+        find_end_extended_name as _find_end_extended_name)
+except ImportError:
+    # Otherwise use the CFFI delimiter scanner when it is built.
+    if _scanner is not None:
+        _find_char = _find_char_cffi
+
+
+# Command lines repeat a lot (status polls, "A/"), so keep a small cache of
+# cleaned lines.
+@lru_cache(maxsize=128)
+def _clean_line(data):
+    # Most command lines have no quoted sections
+    if '"' not in data:
+        return data.replace(' ', '').upper()
+
+    return _clean(data)
+
 
 class ATParser(object):
     """
@@ -78,14 +195,18 @@ class ATParser(object):
     - Bluetooth Handsfree Profile Spec (HFP 1.5)
     """
 
-    # Extended command type enumeration, only used internally
+    # Command type enumeration, only used internally. Also the index of the
+    # matching handler method in the tuples returned by _lookupMethods.
     TYPE_ACTION = 0   # AT+FOO
     TYPE_READ = 1     # AT+FOO?
     TYPE_SET = 2      # AT+FOO=
     TYPE_TEST = 3     # AT+FOO=?
+    TYPE_BASIC = 4    # ATD
 
     def __init__(self):
         self.commandHandlers = {}
+        # command -> (handler, handler methods), see _lookupMethods
+        self.mMethodCache = {}
         self.mLastInput = ''
 
     def register(self, command, handler):
@@ -102,7 +223,15 @@ class ATParser(object):
         - ``handleSetCommand()``
         - ``handleTestCommand()``
 
-        Only one method will be called for each command processed.
+        Only one method will be called for each command processed. Handlers
+        may leave out methods for command types they don't support; those
+        commands get an ``ERROR`` result.
+
+        Handlers are stored in :py:attr:`commandHandlers`, which may also be
+        changed directly to add or remove handlers. The methods of each
+        handler are looked up once and cached until a different handler is
+        set for the command: methods assigned on a handler afterwards are not
+        seen until it is registered again.
 
         :param command: Command name - a single character for basic commands or
             multiple characters for extended commands.
@@ -110,10 +239,15 @@ class ATParser(object):
         :param handler: Handler to register for the command.
         :type handler: :py:class:`ATCommandHandler`
         """
-        logger.debug('Registering command handler {} for {}'.format(
-            handler, command))
+        logger.debug('Registering command handler %s for %s', handler,
+            command)
+
+        # intern() only accepts exact str (bytes on Python 2.7)
+        if type(command) is str:
+            command = intern(command)
 
         self.commandHandlers[command] = handler
+        self.mMethodCache.pop(command, None)
 
     def clean(self, data):
         """
@@ -125,26 +259,9 @@ class ATParser(object):
         :type data: str
         :rtype: str
         """
-        logging.debug('Cleaning data: {}'.format(data))
-
-        out = []
-        i = 0
-        while i < len(data):
-            c = data[i]
-            if c == '"':
-                j = data.find('"', i + 1)  # search for closing "
-                if j == -1:  # unmatched ", insert one.
-                    out.append(data[i:])
-                    out.append('"')
-                    break
+        logger.debug('Cleaning data: %s', data)
 
-                out.append(data[i:j + 1])
-                i = j
-            elif c != ' ':
-                out.append(c.capitalize())
-            i += 1
-
-        return "".join(out)
+        return _clean_line(data)
 
 
     def isAtoZ(self, char):
@@ -171,19 +288,7 @@ class ATParser(object):
         :param fromIndex:
         :type fromIndex: int
         """
-        i = fromIndex
-        while i < len(data):
-            c = data[i]
-            if c == '"':
-                i = data.find('"', i + 1)
-                if i == -1:
-                    return len(data)
-
-            elif c == ch:
-                return i
-            i += 1
-
-        return len(data)
+        return _find_char(ch, data, fromIndex)
 
     def generateArgs(self, data):
         """
@@ -194,18 +299,27 @@ class ATParser(object):
         :type data: str
         :rtype: list
         """
-        i = 0
-        out = []
-        while i <= len(data):
-            j = self.findChar(',', data, i)
+        # Arguments end at each comma outside quotes, and at end of line.
+        ends = [m.start(1) for m in _FIND_COMMA.finditer(data)
+                if m.group(1) is not None]
+        ends.append(len(data))
+        starts = [0] + [j + 1 for j in ends[:-1]]
 
+        out = []
+        for i, j in zip(starts, ends):
             arg = data[i:j]
-            try:
-                out.append(int(arg))
-            except ValueError:
-                out.append(arg)
 
-            i = j + 1  # move past comma
+            # only attempt integer conversion on plausible candidates,
+            # raising ValueError is expensive for string arguments. int()
+            # also accepts leading whitespace and non-ASCII digits.
+            if arg and (arg[0] in _INT_START or arg[0].isspace() or
+                        arg[0].isdigit()):
+                try:
+                    out.append(int(arg))
+                    continue
+                except ValueError:
+                    pass
+            out.append(arg)
 
         return out
 
@@ -221,20 +335,7 @@ class ATParser(object):
         :type index: int
         :rtype: int
         """
-        for i in range(index, len(data)):
-            c = data[i]
-
-            # V.250 defines the following chars as legal extended command
-            # names
-            if self.isAtoZ(c):
-                continue
-            if c >= '0' and c <= '9':
-                continue
-            if c in ['!', '%', '-', '.', '/', ':', '_']:
-                continue
-            return i
-
-        return len(data)
+        return _find_end_extended_name(data, index)
 
     def process(self, data):
         """
@@ -250,14 +351,14 @@ class ATParser(object):
           :py:func:`ATCommandResult.toString()`.
         :rtype: :py:class:`ATCommandResult`
         """
-        logger.debug('process: {}'.format(data))
+        logger.debug('process: %s', data)
 
         inputData = self.clean(data)
 
-        logger.debug('inputData: {}'.format(inputData))
+        logger.debug('inputData: %s', inputData)
 
         # Handle "A/" (repeat previous line)
-        if inputData[0:2] == "A/":
+        if inputData.startswith("A/"):
             inputData = str(self.mLastInput)
         else:
             self.mLastInput = str(inputData)
@@ -268,95 +369,256 @@ class ATParser(object):
             return ATCommandResult(ATCommandResult.UNSOLICITED)
 
         # Anything else deserves an error
-        if inputData[0:2] != "AT":
+        if not inputData.startswith("AT"):
             # Return ["ERROR"]
             return ATCommandResult(ATCommandResult.ERROR)
 
         # Ok we have a command that starts with AT. Process it
-        index = 2
         result = ATCommandResult(ATCommandResult.UNSOLICITED)
+        transitions = self._TRANSITIONS
+        state = _S_START
+        index = 2
+        n = len(inputData)
 
-        while index < len(inputData):
-            c = inputData[index]
-
-            if self.isAtoZ(c):
-                # Option 1: Basic Command
-                # Pass the rest of the line as is to the handler. Do not
-                # look for any more commands on this line.
-                args = inputData[index + 1:]
-                logger.debug('args: {} - char: {} - commandHandlers: {}'.format(
-                    args, c, self.commandHandlers))
-                if c in self.commandHandlers:
-                    result.addResult(self.commandHandlers.get(c).handleBasicCommand(args))
-                    return result
-                else:
-                    # no handler
-                    result.addResult(ATCommandResult(ATCommandResult.ERROR))
-                    return result
+        while state != _S_DONE and index < n:
+            action = transitions[state][
+                _CHAR_CLASS.get(inputData[index], _C_OTHER)]
+            if action is None:
+                # Can't tell if this is a basic or extended command.
+                # Push forwards and hope we hit something.
+                index += 1
+            else:
+                state, index = getattr(self, action)(inputData, index,
+                    result)
+
+        # Finished processing, either at the end of the line or at the
+        # first command that failed
+        return result
 
-            if c == '+':
-                # Option 2: Extended Command
-                # Search for first non-name character. Short-circuit if
-                # we don't handle this command name.
-                i = self.findEndExtendedName(inputData, index + 1)
-                commandName = inputData[index:i]
+    def processMany(self, lines):
+        """
+        Processes a batch of incoming AT command lines, in order.
+
+        Equivalent to calling :py:func:`process` for each line, for callers
+        that read several buffered lines at once.
+
+        :param lines: The AT input lines, without EOL delimiters.
+        :type lines: iterable
+        :return: Result object for each command line.
+        :rtype: list
+        """
+        process = self.process
+        return [process(data) for data in lines]
+
+    def freeze(self):
+        """
+        Replace :py:func:`process` on this instance with a version
+        specialized for it.
+
+        The specialized version binds the parser's scanner methods, the
+        handler table and the constants it needs when :py:func:`freeze` is
+        called, instead of looking them up for every command. It skips the
+        debug messages :py:func:`process` logs for each line and command, but
+        :py:func:`clean` still logs. Scanner actions (``_processBasic`` and
+        ``_processExtended``) overridden by a subclass are called as usual.
+        Call it once all handlers are registered; handlers registered later
+        are still found, but scanner methods replaced later are not.
+        """
+        lookupMethods = self._lookupMethods
+        clean = self.clean
+        findChar = self.findChar
+        findEndExtendedName = self.findEndExtendedName
+        callBasic = self._callBasic
+        callExtended = self._callExtended
+        charClassOf = _CHAR_CLASS.get
+        OK = ATCommandResult.OK
+        # Scanner actions replaced by a subclass, None if inlined below
+        processBasic = processExtended = None
+        if self._overrides('_processBasic'):
+            processBasic = self._processBasic
+        if self._overrides('_processExtended'):
+            processExtended = self._processExtended
+        ERROR = ATCommandResult.ERROR
+        UNSOLICITED = ATCommandResult.UNSOLICITED
+
+        def process(data):
+            inputData = clean(data)
+
+            # Handle "A/" (repeat previous line)
+            if inputData.startswith("A/"):
+                inputData = self.mLastInput
+            else:
+                self.mLastInput = inputData
+
+            # Handle empty line - no response necessary
+            if inputData == '':
+                return ATCommandResult(UNSOLICITED)
+
+            # Anything else deserves an error
+            if not inputData.startswith("AT"):
+                return ATCommandResult(ERROR)
+
+            result = ATCommandResult(UNSOLICITED)
+            index = 2
+            n = len(inputData)
+
+            while index < n:
+                c = inputData[index]
+                charClass = charClassOf(c)
+
+                if charClass == _C_ALPHA:
+                    if processBasic is not None:
+                        state, index = processBasic(inputData, index, result)
+                        if state == _S_DONE:
+                            return result
+                        continue
+
+                    # Basic command, takes the rest of the line
+                    result.addResult(callBasic(lookupMethods(c),
+                        inputData[index + 1:]))
+                    return result
 
-                if commandName not in self.commandHandlers:
-                    # no handler
-                    result.addResult(ATCommandResult(ATCommandResult.ERROR))
+                if charClass != _C_PLUS:
+                    index += 1
+                    continue
+
+                if processExtended is not None:
+                    state, index = processExtended(inputData, index, result)
+                    if state == _S_DONE:
+                        return result
+                    continue
+
+                # Extended command
+                i = findEndExtendedName(inputData, index + 1)
+                methods = lookupMethods(inputData[index:i])
+                if methods is None:
+                    result.addResult(ATCommandResult(ERROR))
                     return result
 
-                handler = self.commandHandlers.get(commandName)
-                logger.debug('commandName: {}, handler: {}'.format(commandName, handler))
-
-                # Search for end of this command - this is usually the end of
-                # line
-                endIndex = self.findChar(';', inputData, index)
-
-                # Determine what type of command this is.
-                # Default to TYPE_ACTION if we can't find anything else
-                # obvious.
-                if i >= endIndex:
-                    commandType = self.TYPE_ACTION
-                elif inputData[i] == '?':
-                    commandType = self.TYPE_READ
-                elif inputData[i] == '=':
-                    if (i + 1) < endIndex:
-                        if inputData[i + 1] == '?':
-                            commandType = self.TYPE_TEST
-                        else:
-                            commandType = self.TYPE_SET
-                    else:
-                        commandType = self.TYPE_SET
-                else:
-                    commandType = self.TYPE_ACTION
-
-                # Call this command. Short-circuit as soon as a command fails
-                if commandType == self.TYPE_ACTION:
-                    result.addResult(handler.handleActionCommand())
-
-                elif commandType == self.TYPE_READ:
-                    result.addResult(handler.handleReadCommand())
-
-                elif commandType == self.TYPE_TEST:
-                    result.addResult(handler.handleTestCommand())
-
-                elif commandType == self.TYPE_SET:
-                    args = self.generateArgs(inputData[i + 1:endIndex])
-                    result.addResult(handler.handleSetCommand(args))
-
-                if result.getResultCode() != ATCommandResult.OK:
+                endIndex = findChar(';', inputData, index)
+                result.addResult(callExtended(methods, inputData, i, endIndex))
+
+                if result.mResultCode != OK:
                     return result
 
                 index = endIndex
 
-            else:
-                # Can't tell if this is a basic or extended command.
-                # Push forwards and hope we hit something.
-                index += 1
+            return result
+
+        self.process = process
+
+    def _overrides(self, name):
+        # Indicates if this parser's class replaces ATParser method name
+        method = getattr(type(self), name)
+        method = getattr(method, '__func__', method)
+        return method is not ATParser.__dict__[name]
+
+    def _processBasic(self, inputData, index, result):
+        # Option 1: Basic Command
+        # Pass the rest of the line as is to the handler. Do not
+        # look for any more commands on this line.
+        c = inputData[index]
+        args = inputData[index + 1:]
+        logger.debug('args: %s - char: %s - commandHandlers: %s', args, c,
+            self.commandHandlers)
+        result.addResult(self._callBasic(self._lookupMethods(c), args))
+
+        return _S_DONE, index
+
+    def _processExtended(self, inputData, index, result):
+        # Option 2: Extended Command
+        # Search for first non-name character. Short-circuit if
+        # we don't handle this command name.
+        i = self.findEndExtendedName(inputData, index + 1)
+        commandName = inputData[index:i]
+
+        methods = self._lookupMethods(commandName)
+        if methods is None:
+            # no handler
+            result.addResult(ATCommandResult(ATCommandResult.ERROR))
+            return _S_DONE, index
+
+        logger.debug('commandName: %s', commandName)
+
+        # Search for end of this command - this is usually the end of
+        # line
+        endIndex = self.findChar(';', inputData, index)
+
+        # Call this command. Short-circuit as soon as a command fails
+        result.addResult(self._callExtended(methods, inputData, i, endIndex))
+        if result.getResultCode() != ATCommandResult.OK:
+            return _S_DONE, endIndex
+
+        return _S_START, endIndex
+
+    def _lookupMethods(self, command):
+        # Return the handler methods for command indexed by command type,
+        # or None if there is no handler. commandHandlers decides which
+        # handler is used; the methods are cached per handler.
+        handler = self.commandHandlers.get(command)
+        if handler is None:
+            return None
+
+        cached = self.mMethodCache.get(command)
+        if cached is None or cached[0] is not handler:
+            cached = (handler, (
+                getattr(handler, 'handleActionCommand', None),
+                getattr(handler, 'handleReadCommand', None),
+                getattr(handler, 'handleSetCommand', None),
+                getattr(handler, 'handleTestCommand', None),
+                getattr(handler, 'handleBasicCommand', None),
+            ))
+            self.mMethodCache[command] = cached
+
+        return cached[1]
+
+    def _callBasic(self, methods, args):
+        # Call the basic command handler method from the methods returned by
+        # _lookupMethods (None if there is no handler).
+        method = methods and methods[self.TYPE_BASIC]
+        if method is None:
+            # no handler
+            return ATCommandResult(ATCommandResult.ERROR)
 
-        # Finished processing (and all results were ok)
-        return result
+        return method(args)
+
+    def _callExtended(self, methods, inputData, i, endIndex):
+        # Call the extended command handler method for the command whose
+        # name ends at i and which ends at endIndex.
+
+        # Determine what type of command this is from the character
+        # following the name. Default to TYPE_ACTION if we can't find
+        # anything else obvious.
+        commandType = self.TYPE_ACTION
+        if i < endIndex:
+            commandType = self._EXTENDED_TYPES.get(
+                _CHAR_CLASS.get(inputData[i]), self.TYPE_ACTION)
+            if (commandType == self.TYPE_SET and (i + 1) < endIndex and
+                    inputData[i + 1] == '?'):
+                commandType = self.TYPE_TEST
+
+        method = methods[commandType]
+        if method is None:
+            # handler doesn't support this command type
+            return ATCommandResult(ATCommandResult.ERROR)
+
+        if commandType == self.TYPE_SET:
+            return method(self.generateArgs(inputData[i + 1:endIndex]))
+
+        return method()
+
+    # Name of the scanner action for each character class, indexed by state.
+    # None skips the character. _S_DONE ends the scan so it has no actions.
+    _TRANSITIONS = (
+        # _S_START: other, alpha, plus, equals, query
+        (None, '_processBasic', '_processExtended', None, None),
+    )
+
+    # Extended command type for the character class following the name
+    _EXTENDED_TYPES = {
+        _C_QUERY: TYPE_READ,
+        _C_EQUALS: TYPE_SET,
+    }
 
 
 class ATCommandResult(object):
@@ -388,11 +650,27 @@ class ATCommandResult(object):
         :type response:
         """
         self.mResultCode = resultCode
-        self.mResponse = ''
+        self.mResponses = []
 
         if response is not None:
             self.addResponse(response)
 
+    @property
+    def mResponse(self):
+        """
+        The response lines added so far, joined with a double CRLF.
+        Assigning it replaces all response lines.
+
+        :rtype: str
+        """
+        return '\r\n\r\n'.join(self.mResponses)
+
+    @mResponse.setter
+    def mResponse(self, value):
+        self.mResponses = []
+        if value is not None:
+            self.addResponse(value)
+
     def getResultCode(self):
         """
         :rtype: int
@@ -406,7 +684,11 @@ class ATCommandResult(object):
         :param response:
         :type response: str
         """
-        self.mResponse = self.appendWithCrlf(self.mResponse, response)
+        if not isinstance(response, str):
+            response = str(response)
+
+        if response:
+            self.mResponses.append(response)
 
     def addResult(self, result):
         """
@@ -418,11 +700,10 @@ class ATCommandResult(object):
         :param result: The :py:class:`ATCommandResult` to add to this result.
         :type result: :py:class:`ATCommandResult`
         """
-        logger.debug('addResult: {}'.format(result))
+        logger.debug('addResult: %s', result)
 
         if result is not None:
-            self.mResponse = self.appendWithCrlf(self.mResponse,
-                result.mResponse)
+            self.mResponses.extend(result.mResponses)
             self.mResultCode = result.mResultCode
 
     def toString(self):
@@ -431,24 +712,30 @@ class ATCommandResult(object):
 
         :rtype: str
         """
-        result = str(self.mResponse)
+        lines = list(self.mResponses)
         if self.mResultCode == self.OK:
-            result = self.appendWithCrlf(result, self.OK_STRING)
+            lines.append(self.OK_STRING)
 
         elif self.mResultCode == self.ERROR:
-            result = self.appendWithCrlf(result, self.ERROR_STRING)
+            lines.append(self.ERROR_STRING)
 
-        return result
+        return '\r\n\r\n'.join(lines)
 
     def appendWithCrlf(self, str1, str2):
         """
         Append a string, joining with a double CRLF. Used to create multi-line
         AT command replies.
+
+        :param str1:
+        :type str1: str
+        :param str2:
+        :type str2: str
+        :rtype: str
         """
-        if len(str1) > 0 and len(str2) > 0:
-            str1 += '\r\n\r\n'
+        if str1 and str2:
+            return str1 + '\r\n\r\n' + str2
 
-        return str1 + str(str2)
+        return str1 or str2
 
 
 class ATCommandHandler(object):
@@ -235,6 +235,165 @@ class RepeatCommandTest(TestCase):
         self.assertEqual(result.toString(), ATCommandResult.OK_STRING)
 
 
+class ProcessManyTest(TestCase):
+    """
+    Support for processing a batch of command lines.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+        a = BasicCommandHandler()
+        b = ExtendedCommandHandler()
+        self.parser.register('A', a)
+        self.parser.register('+B', b)
+
+    def test_strings(self):
+        self.assertEqual(self.parser.processMany([]), [])
+
+        results = self.parser.processMany(['ATA', 'A/', '', 'AT+C', 'AT+B?'])
+        self.assertEqual([r.toString() for r in results], [
+            ATCommandResult.OK_STRING,
+            ATCommandResult.OK_STRING,
+            '',
+            ATCommandResult.ERROR_STRING,
+            ATCommandResult.OK_STRING])
+
+
+class FreezeTest(TestCase):
+    """
+    A frozen parser gives the same results as an unfrozen one.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+        self.frozen = ATParser()
+        for parser in (self.parser, self.frozen):
+            parser.register('A', BasicCommandHandler())
+            parser.register('+B', ExtendedCommandHandler())
+            parser.register('+C', ExtendedCommandHandler2())
+        self.frozen.freeze()
+
+    def test_strings(self):
+        lines = ['', '   ', 'BF+A', 'A/', 'ATA', 'A/', 'ATZ', 'AT+B?;+B=?',
+            'AT+B=1,"a;b",2;+B', 'AT+B100;+C', 'AT+B;+C=;+C', 'AT+C',
+            'AT,+B', 'AT+D', 'ATA"', 'at+b="x']
+        for line in lines:
+            self.assertEqual(self.frozen.process(line).toString(),
+                self.parser.process(line).toString())
+
+    def test_register(self):
+        result = self.frozen.process('AT+D')
+        self.assertEqual(result.toString(), ATCommandResult.ERROR_STRING)
+
+        self.frozen.register('+D', ExtendedCommandHandler())
+        result = self.frozen.process('AT+D')
+        self.assertEqual(result.toString(), ATCommandResult.OK_STRING)
+
+
+class DuckTypedHandlerTest(TestCase):
+    """
+    Handlers don't have to implement every handler method.
+    """
+    class Dial(object):
+        def handleBasicCommand(self, arg):
+            return ATCommandResult(ATCommandResult.OK)
+
+    class Volume(object):
+        def handleReadCommand(self):
+            return ATCommandResult(ATCommandResult.OK, '+VGM: 14')
+
+    def test_strings(self):
+        frozen = ATParser()
+        frozen.freeze()
+
+        for p in (ATParser(), frozen):
+            p.register('D', self.Dial())
+            p.register('+VGM', self.Volume())
+
+            self.assertEqual(p.process('ATD1234').toString(),
+                ATCommandResult.OK_STRING)
+            self.assertEqual(p.process('AT+VGM?').toString(),
+                '+VGM: 14\r\n\r\nOK')
+            self.assertEqual(p.process('AT+VGM=?').toString(),
+                ATCommandResult.ERROR_STRING)
+            self.assertEqual(p.process('AT+VGM?;+VGM=1').toString(),
+                '+VGM: 14\r\n\r\nERROR')
+            self.assertEqual(p.process('AT+VGM').toString(),
+                ATCommandResult.ERROR_STRING)
+            self.assertEqual(p.process('AT+VGM?;D').toString(),
+                '+VGM: 14\r\n\r\nOK')
+
+
+class RegisterTest(TestCase):
+    """
+    Registering handlers, by :py:func:`ATParser.register` or directly in
+    :py:attr:`ATParser.commandHandlers`.
+    """
+    class Name(str):
+        pass
+
+    def test_strings(self):
+        parser = ATParser()
+        parser.register(self.Name('+A'), ExtendedCommandHandler())
+        parser.register(u'+B', ExtendedCommandHandler())
+
+        self.assertEqual(parser.process('AT+A;+B').toString(),
+            ATCommandResult.OK_STRING)
+
+    def test_command_handlers(self):
+        frozen = ATParser()
+        frozen.freeze()
+
+        for parser in (ATParser(), frozen):
+            parser.commandHandlers['+A'] = ExtendedCommandHandler()
+            self.assertEqual(parser.process('AT+A=?').toString(),
+                ATCommandResult.OK_STRING)
+
+            # replacing a handler
+            parser.commandHandlers['+A'] = ExtendedCommandHandler2()
+            self.assertEqual(parser.process('AT+A').toString(),
+                ATCommandResult.ERROR_STRING)
+
+            # removing a handler
+            parser.register('+B', ExtendedCommandHandler())
+            self.assertEqual(parser.process('AT+B').toString(),
+                ATCommandResult.OK_STRING)
+            del parser.commandHandlers['+B']
+            self.assertEqual(parser.process('AT+B').toString(),
+                ATCommandResult.ERROR_STRING)
+
+
+class SubclassTest(TestCase):
+    """
+    Scanner actions overridden in a subclass are used.
+    """
+    class Parser(ATParser):
+        def _processBasic(self, inputData, index, result):
+            result.addResponse('basic')
+            return ATParser._processBasic(self, inputData, index, result)
+
+    def test_strings(self):
+        parser = self.Parser()
+        parser.register('A', BasicCommandHandler())
+
+        self.assertEqual(parser.process('AT;A').toString(),
+            'basic\r\n\r\nOK')
+
+    def test_frozen(self):
+        parser = self.Parser()
+        parser.register('A', BasicCommandHandler())
+        parser.register('+B', ExtendedCommandHandler())
+        parser.freeze()
+
+        self.assertEqual(parser.process('AT;A').toString(),
+            'basic\r\n\r\nOK')
+        self.assertEqual(parser.process('AT+B;A').toString(),
+            'basic\r\n\r\nOK')
+
+        # not overridden
+        parser = ATParser()
+        self.assertFalse(parser._overrides('_processBasic'))
+        self.assertFalse(parser._overrides('_processExtended'))
+
+
 class HandlerDefaultTest(TestCase):
     """
     Default values for :py:class:`ATCommandHandler`.
@@ -271,3 +430,118 @@ class ReturnValueTest(TestCase):
         result = self.parser.process('AT{}{}'.format(commandName, commandArg))
         a.handleBasicCommand.assert_called_with(commandArg)
         self.assertEqual(result.toString(), '120\r\n\r\nOK')
+
+
+class CleanTest(TestCase):
+    """
+    Whitespace and case handling in :py:func:`ATParser.clean`.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+
+    def test_strings(self):
+        self.assertEqual(self.parser.clean(''), '')
+        self.assertEqual(self.parser.clean(' a t + v g m ? '), 'AT+VGM?')
+        self.assertEqual(self.parser.clean('at+a="foo BaR",1'),
+            'AT+A="foo BaR",1')
+        self.assertEqual(self.parser.clean('at+a="x" , "y z"'),
+            'AT+A="x","y z"')
+
+        # already clean lines are returned unchanged
+        for line in ['AT', 'ATD1234;', 'AT+VGM=14', 'AT+A="x y",1', '""']:
+            self.assertEqual(self.parser.clean(line), line)
+
+        # scanning resumes after each quoted section
+        self.assertEqual(self.parser.clean('a"" b""c'), 'A""B""C')
+        self.assertEqual(self.parser.clean('a"b c"d e"f"g'), 'A"b c"DE"f"G')
+
+        # unmatched quotes are closed
+        self.assertEqual(self.parser.clean('ATA"'), 'ATA""')
+        self.assertEqual(self.parser.clean('ata"b c'), 'ATA"b c"')
+
+
+class FindEndExtendedNameTest(TestCase):
+    """
+    Extended command name boundaries.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+
+    def test_strings(self):
+        self.assertEqual(self.parser.findEndExtendedName('AT+VGM?', 3), 6)
+        self.assertEqual(self.parser.findEndExtendedName('AT+VGM=1', 3), 6)
+        self.assertEqual(self.parser.findEndExtendedName('AT+A!%-./:_9', 3),
+            12)
+        self.assertEqual(self.parser.findEndExtendedName('AT+VGM', 3), 6)
+        self.assertEqual(self.parser.findEndExtendedName('AT+', 3), 3)
+        self.assertEqual(self.parser.findEndExtendedName('AT+C;+B', 3), 4)
+
+
+class FindCharTest(TestCase):
+    """
+    Delimiter search in :py:func:`ATParser.findChar`.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+
+    def test_strings(self):
+        self.assertEqual(self.parser.findChar(';', 'AT+C;+B', 2), 4)
+        self.assertEqual(self.parser.findChar(';', 'AT+C;+B', 5), 7)
+        self.assertEqual(self.parser.findChar(',', '"a,b",c', 0), 5)
+        self.assertEqual(self.parser.findChar(',', '1,2', 2), 3)
+        self.assertEqual(self.parser.findChar(';', 'AT+C="x;y";+B', 2), 10)
+        self.assertEqual(self.parser.findChar('=', '"=",=', 0), 4)
+
+        # unmatched quote hides the rest of the line
+        self.assertEqual(self.parser.findChar(',', '"a,b', 0), 4)
+
+
+class GenerateArgsTest(TestCase):
+    """
+    Argument splitting in :py:func:`ATParser.generateArgs`.
+    """
+    def setUp(self):
+        self.parser = ATParser()
+
+    def test_strings(self):
+        self.assertEqual(self.parser.generateArgs(''), [''])
+        self.assertEqual(self.parser.generateArgs('14'), [14])
+        self.assertEqual(self.parser.generateArgs('3,0,-1,+2'), [3, 0, -1, 2])
+        self.assertEqual(self.parser.generateArgs(',,'), ['', '', ''])
+        self.assertEqual(self.parser.generateArgs('"foo",1,"b,ar'),
+            ['"foo"', 1, '"b,ar'])
+        self.assertEqual(self.parser.generateArgs('1A,-,"2"'),
+            ['1A', '-', '"2"'])
+        self.assertEqual(self.parser.generateArgs(u'\t5, 7 ,\u0663,\xb2'),
+            [5, 7, 3, u'\xb2'])
+
+
+class ResultTest(TestCase):
+    """
+    Response building in :py:class:`ATCommandResult`.
+    """
+    def test_strings(self):
+        result = ATCommandResult(ATCommandResult.UNSOLICITED)
+        self.assertEqual(result.toString(), '')
+
+        result.addResponse('+VGM: 14')
+        result.addResponse('')
+        result.addResult(ATCommandResult(ATCommandResult.OK, '+CIMI: 1'))
+        result.addResult(ATCommandResult(ATCommandResult.OK))
+        self.assertEqual(result.mResponse, '+VGM: 14\r\n\r\n+CIMI: 1')
+        self.assertEqual(result.toString(),
+            '+VGM: 14\r\n\r\n+CIMI: 1\r\n\r\nOK')
+
+        self.assertEqual(result.appendWithCrlf('', ''), '')
+        self.assertEqual(result.appendWithCrlf('a', ''), 'a')
+        self.assertEqual(result.appendWithCrlf('', 'b'), 'b')
+        self.assertEqual(result.appendWithCrlf('a', 'b'), 'a\r\n\r\nb')
+
+        result.addResult(ATCommandResult(ATCommandResult.ERROR, 3))
+        self.assertEqual(result.toString(),
+            '+VGM: 14\r\n\r\n+CIMI: 1\r\n\r\n3\r\n\r\nERROR')
+
+        result.mResponse = '+VGS: 3'
+        self.assertEqual(result.toString(), '+VGS: 3\r\n\r\nERROR')
+        result.mResponse = ''
+        self.assertEqual(result.toString(), ATCommandResult.ERROR_STRING)
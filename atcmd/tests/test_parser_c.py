@@ -0,0 +1,71 @@
+# Copyright (c) Collab and contributors.
+# See LICENSE for details.
+
+"""
+Tests for :py:mod:`atcmd._parser_c`.
+"""
+
+import random
+
+from unittest import TestCase, skipIf
+
+from atcmd import parser
+
+try:
+    from atcmd import _parser_c
+except ImportError:
+    _parser_c = None
+
+
+@skipIf(_parser_c is None, 'compiled scanners are not built')
+class ScannerTest(TestCase):
+    """
+    The compiled scanners give the same results as the pure-Python ones.
+    """
+    alphabet = u'aAzZ09+=?;,!%-./:_"  \t\xdfﬁŉ\xe9'
+
+    def setUp(self):
+        rnd = random.Random(0)
+        self.lines = [u'', u'"', u'ATA"', u'a\xdf"x"', u'ﬁ"x"',
+            u'ŉ"x"', u'at+a="b,c";+d', u'AT+CIND?']
+        for _ in range(2000):
+            self.lines.append(u''.join(rnd.choice(self.alphabet)
+                for _ in range(rnd.randint(0, 16))))
+
+    class Line(str):
+        pass
+
+    def test_str_subclass(self):
+        for line in self.lines[:8]:
+            sub = self.Line(line)
+            self.assertEqual(_parser_c.clean(sub), parser._clean_py(sub))
+            self.assertEqual(_parser_c.find_char(self.Line(u';'), sub, 0),
+                parser._find_char_py(u';', sub, 0))
+            self.assertEqual(_parser_c.find_end_extended_name(sub, 0),
+                parser._find_end_extended_name_py(sub, 0))
+
+        result = parser.ATParser().process(self.Line(u'AT+A="x"'))
+        self.assertEqual(result.toString(),
+            parser.ATCommandResult.ERROR_STRING)
+
+    def test_clean(self):
+        for line in self.lines:
+            self.assertEqual(_parser_c.clean(line), parser._clean_py(line),
+                repr(line))
+
+    def test_find_char(self):
+        for line in self.lines:
+            for ch in u';,"':
+                for index in range(-2, len(line) + 2):
+                    self.assertEqual(
+                        _parser_c.find_char(ch, line, index),
+                        parser._find_char_py(ch, line, index),
+                        (ch, line, index))
+
+    def test_find_end_extended_name(self):
+        for line in self.lines:
+            for index in range(-2, len(line) + 2):
+                self.assertEqual(
+                    _parser_c.find_end_extended_name(line, index),
+                    parser._find_end_extended_name_py(line, index),
+                    (line, index))
@@ -0,0 +1,38 @@
+# Copyright (c) Collab and contributors.
+# See LICENSE for details.
+
+"""
+Tests for the CFFI delimiter scanner, :py:mod:`atcmd._scanner_cffi`.
+"""
+
+import random
+
+from unittest import TestCase, skipIf
+
+from atcmd import parser
+
+
+@skipIf(parser._scanner is None, 'CFFI scanner is not built')
+class ScannerTest(TestCase):
+    """
+    The CFFI delimiter scanner gives the same results as the pure-Python
+    one.
+    """
+    alphabet = u'aAzZ09+=?;,"  \t\xe9'
+
+    def setUp(self):
+        rnd = random.Random(0)
+        self.lines = [u'', u'"', u'ATA"', u'at+a="b,c";+d', u'AT+C;+B',
+            u'"a;b";c', u'\xe9;"x;y";z']
+        for _ in range(2000):
+            self.lines.append(u''.join(rnd.choice(self.alphabet)
+                for _ in range(rnd.randint(0, 16))))
+
+    def test_find_char(self):
+        for line in self.lines:
+            for ch in (u';', u',', u'"', u'', u';,', u'\xe9'):
+                for index in range(-2, len(line) + 2):
+                    self.assertEqual(
+                        parser._find_char_cffi(ch, line, index),
+                        parser._find_char_py(ch, line, index),
+                        (ch, line, index))
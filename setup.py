@@ -4,6 +4,64 @@
 import os, sys
 
 from setuptools import setup
+from setuptools.command.build_ext import build_ext
+
+try:
+    from distutils.errors import (CCompilerError, DistutilsExecError,
+        DistutilsPlatformError)
+except ImportError:
+    from setuptools.errors import (CCompilerError,
+        ExecError as DistutilsExecError,
+        PlatformError as DistutilsPlatformError)
+
+
+class optional_build_ext(build_ext):
+    """
+    Build the optional extensions, but fall back to the pure-Python parser
+    when they fail to compile (e.g. when no C compiler is available).
+    """
+    def run(self):
+        try:
+            build_ext.run(self)
+        except DistutilsPlatformError as e:
+            self.warn('Skipping optional extensions: {}'.format(e))
+
+    def build_extensions(self):
+        self.skipped = set()
+        build_ext.build_extensions(self)
+
+        # don't copy or install extensions that failed to build
+        self.extensions = [ext for ext in self.extensions
+                           if ext.name not in self.skipped]
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, DistutilsExecError,
+                DistutilsPlatformError) as e:
+            self.warn('Skipping optional {}: {}'.format(ext.name, e))
+            self.skipped.add(ext.name)
+
+# optional compiled scanners, see atcmd/_parser_c.pyx
+ext_modules = []
+if sys.version_info[0] >= 3:
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        pass
+    else:
+        ext_modules = cythonize(['atcmd/_parser_c.pyx'])
+
+# optional C delimiter scanner, see atcmd/_scanner.c
+extra_options = {}
+try:
+    from cffi import __version_info__ as cffi_version
+except ImportError:
+    cffi_version = (0,)
+
+# cffi_modules was added in CFFI 1.0
+if cffi_version >= (1, 0):
+    extra_options['cffi_modules'] = ['atcmd/_scanner_build.py:ffibuilder']
 
 # get version nr
 sys.path.insert(0, os.path.abspath(os.path.join(
@@ -22,6 +80,8 @@ setup(
     author_email='info@collab.nl',
     packages=['atcmd'],
     include_package_data=True,
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
@@ -34,5 +94,6 @@ setup(
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.4'
-    ]
+    ],
+    **extra_options
 )